@@ -1,5 +1,8 @@
 from sqlalchemy.dialects import registry
+import functools
+import importlib.util
 import logging
+import sys
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
@@ -27,72 +30,103 @@ def sane_traceback(now: bool = True) -> str:
 
     If you specify now=False, you'll get the most recent exception rather than the current stack
     """
-    import traceback, sys
-    _type, val, tb = sys.exc_info()
-    if now or (val is None):
-        # no exception has occurred (or we were specifically asked for the current stack)
-        tb = traceback.extract_stack()
+    import traceback
+    _type, val = sys.exc_info()[:2]
+    if not now and val is not None:
+        return traceback.format_exc()
 
-        tb = tb[0:-1]  # remove the extract_stack call from the trace (i.e 'sane_traceback' will be the end of the tb)
-    else:
-        tb = traceback.extract_tb(tb)
-
-    ret = "".join(traceback.format_list(tb))
+    # no exception has occurred (or we were specifically asked for the current stack)
+    #  the last frame is the sane_traceback call, which we don't include
+    ret = "".join(traceback.format_stack()[:-1])
 
     if val is not None:  # include exception info in the trace
-        excret = traceback.format_exception_only(_type, val)
-        ret += "\n" + ("".join(excret))
+        ret += "\n" + "".join(traceback.format_exception_only(_type, val))
 
     return ret
 
 
+_hypertable_index_listener_registered = False
+
 def autocreate_hypertable_indexes():
     """
-    Here we patch in a new function to replace sqlalchemy.sql.schema.Table.__init__
-    This new function:
-    1. calls the original __init__ function
-    2. checks if the table is a hypertable
-    3. if it is, creates an index on the time column to match the index
-        which is automatically created by timescaledb when create_hypertable() is called
-        This is necessary so that alembic is aware of these indexes and doesn't try to
-        drop them on subsequent migrations
+    Here we make sure that every hypertable gets an index on its time column to match the index
+     which is automatically created by timescaledb when create_hypertable() is called
+    This is necessary so that alembic is aware of these indexes and doesn't try to
+     drop them on subsequent migrations
+
+    The index can only be created once the table has both its timescaledb options and its time column,
+     and these can arrive in either order:
+    - Table(name, metadata, *columns, timescaledb_hypertable=...) sets the options first, then attaches columns,
+       so we listen for sqlalchemy's after_parent_attach event on Column
+    - Table(..., extend_existing=True, timescaledb_hypertable=...) for an existing (or reflected) table attaches
+       columns first, then sets the options. No event fires after that, so we also wrap Table._extra_kwargs
+
+    (we can't use Table's own after_parent_attach, because that fires before the table's
+     dialect options and columns have been set up)
     """
 
-    from sqlalchemy import Index
+    # prevent registering the listener multiple times
+    global _hypertable_index_listener_registered
+    if _hypertable_index_listener_registered:
+        return
+
+    _hypertable_index_listener_registered = True
+
+    from sqlalchemy import Column, Index, event
     from sqlalchemy.sql.schema import Table
 
-    _orig_table_init_ = Table.__init__
+    def _add_hypertable_index_(table):
+        # (dict.get rather than [] - we don't want sqlalchemy to populate timescaledb options for every table)
+        tsdb_dialect_opts = table.dialect_options.get('timescaledb')
+        if tsdb_dialect_opts is None:
+            # no timescaledb options (i.e the vast majority of tables), nothing to do
+            return
 
-    def _table_init_override_(self, *args, **kwargs):
-        # do regular table init:
-        ret = _orig_table_init_(self, *args, **kwargs)
+        # (this is None unless timescaledb_hypertable was given, see TimescaledbDialect.construct_arguments)
+        tsdb_opts = tsdb_dialect_opts['hypertable']
+        if tsdb_opts is None:
+            # not a hypertable, nothing to do
+            return
 
-        if hasattr(self,"_hypertable_index"):
+        if getattr(table, "_hypertable_index", None) is not None:
             # we've already created a hypertable index for this table, don't do it again
-            return ret
+            return
 
-        # if it's a hypertable, we declare an index on the relevant field
-        if 'timescaledb_hypertable' in kwargs:
-            tsdb_opts = kwargs.get('timescaledb_hypertable',{})
+        # it's a hypertable, we declare an index on the relevant field
+        column_name = tsdb_opts.get('time_column_name',None)
+        if not column_name:
+            raise ValueError("Timescaledb hypertables must have a time_column_name defined!")
 
-            column_name = tsdb_opts.get('time_column_name',None)
-            if not column_name:
-                raise ValueError("Timescaledb hypertables must have a time_column_name defined!")
+        column = table.c.get(column_name)
+        if column is None:
+            # the time column hasn't been attached yet
+            return
 
-            index_name = f"{self.name}_{column_name}_idx"
+        # (the dialect module has been loaded by now - it's needed to validate the table's timescaledb options)
+        from sqlalchemy_timescaledb.dialect import TimescaledbDialect
+        index_name = TimescaledbDialect._hypertable_index_name(table.name, column_name)
 
-            # Create the index:
-            hypertable_index = Index(index_name, self.columns[column_name].desc())
+        # Create the index (this adds it to table.indexes):
+        hypertable_index = Index(index_name, column.desc())
 
-            # add it to the Table:
-            setattr(self, index_name, hypertable_index)
+        # add table._hypertable_index so we can prevent creating multiple indexes
+        table._hypertable_index = hypertable_index
 
-            # add table._hypertable_index so we can prevent creating multiple indexes
-            setattr(self,"_hypertable_index",hypertable_index)
+        # remember the index name so that alembic integration doesn't need to work it out again
+        table._tsdb_hypertable_index_name = index_name
 
-        return ret
+    @event.listens_for(Column, "after_parent_attach")
+    def _column_attached_(column, table):
+        _add_hypertable_index_(table)
 
-    type.__setattr__(Table, "__init__", _table_init_override_)
+    _orig_extra_kwargs_ = Table._extra_kwargs
+
+    @functools.wraps(_orig_extra_kwargs_)
+    def _extra_kwargs_(self, **kwargs):
+        _orig_extra_kwargs_(self, **kwargs)
+        _add_hypertable_index_(self)
+
+    Table._extra_kwargs = _extra_kwargs_
 
 
 _filter_patched = False
@@ -125,12 +159,53 @@ def alembic_ignore_timescaledb_indexes():
     _filter_patched = True
 
     try:
+        from alembic import util
         from alembic.autogenerate import api
     except ImportError as ex:
         raise ImportError(f"Couldn't import alembic! {ex}") from ex
 
     real_run_object_filters = api.AutogenContext.run_object_filters
 
+    def hypertable_index_name(table):
+        """
+        Returns the name of a table's hypertable index, or None if it isn't a hypertable
+        """
+        index_name = getattr(table, "_tsdb_hypertable_index_name", None)
+        if index_name is not None:
+            return index_name
+
+        # autocreate_hypertable_indexes didn't create an index for this table (e.g its time column is missing),
+        #  so work the name out from the table's options
+        # (dict.get rather than [] - we don't want sqlalchemy to populate timescaledb options for every table)
+        tsdb_dialect_opts = table.dialect_options.get('timescaledb')
+        if tsdb_dialect_opts is None or not tsdb_dialect_opts['hypertable']:
+            return None
+
+        time_column_name = tsdb_dialect_opts['hypertable'].get('time_column_name')
+        if not time_column_name:
+            return None
+
+        from sqlalchemy_timescaledb.dialect import TimescaledbDialect
+        return TimescaledbDialect._hypertable_index_name(table.name, time_column_name)
+
+    def hypertable_index_names(autogen_context) -> frozenset:
+        """
+        Returns the names of the hypertable indexes for all tables in the autogen context's metadata
+
+        This is worked out once per AutogenContext (i.e once per autogenerate run) and cached on the context
+        """
+        names = getattr(autogen_context, "_tsdb_ht_index_names", None)
+        if names is None:
+            names = frozenset(
+                index_name
+                for metadata in util.to_list(autogen_context.metadata, [])
+                for index_name in map(hypertable_index_name, metadata.tables.values())
+                if index_name is not None
+            )
+            autogen_context._tsdb_ht_index_names = names
+
+        return names
+
     def run_object_filters_and_ignore_hypertable_indexes(
         self,obj,name,type_,reflected,compare_to,
     ) -> bool:
@@ -141,30 +216,70 @@ def alembic_ignore_timescaledb_indexes():
         The signature of this function must match api.AutogenContext.run_object_filters
         """
         log.debug(f"running filters for {type_} {name}")
-        if type_ == "index":
-            if hasattr(obj.table, "dialect_options"):
-                opts = obj.table.dialect_options
-                tsdb_opts = opts.get('timescaledb', {})
-                ht_opts = tsdb_opts.get('hypertable', {})
-                time_col = ht_opts.get('time_column_name', "")
-
-                if name == f"{obj.table.name}_{time_col}_idx":
-                    # this index name matches what timescaledb creates automatically
-                    #  when create_hypertable is used. thus, alembic should ignore it.
-                    log.info(f"(Skipping hypertable index '{name}')")
-                    return False
+        if type_ == "index" and name in hypertable_index_names(self):
+            # this index name matches what timescaledb creates automatically
+            #  when create_hypertable is used. thus, alembic should ignore it.
+            log.info(f"(Skipping hypertable index '{name}')")
+            return False
 
         # not a hypertable index, resume normal operation:
         return real_run_object_filters(self,obj,name,type_,reflected,compare_to)
 
     api.AutogenContext.run_object_filters = run_object_filters_and_ignore_hypertable_indexes
 
-autocreate_hypertable_indexes()
+def _on_alembic_import():
+    """
+    Applies our alembic integration: registers TimescaledbImpl and patches autogenerate
+     to ignore timescaledb indexes
+    """
+    from sqlalchemy_timescaledb.dialect import register_alembic_impl
 
-try:
-    import alembic
-except ImportError:
-    pass
-else:
+    register_alembic_impl()
     alembic_ignore_timescaledb_indexes()
 
+
+class _AlembicImportHook:
+    """
+    A meta path finder which runs _on_alembic_import() the first time alembic is imported
+
+    Alembic (and its dependencies, e.g mako) is fairly heavy to import, so rather than importing it
+     unconditionally just to find out whether it's available, we wait until something else imports it.
+    """
+
+    _finding = False
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname != 'alembic' or self._finding:
+            return None
+
+        # find_spec() below asks the meta path (i.e us) again, so don't answer while we're looking
+        self._finding = True
+        try:
+            spec = importlib.util.find_spec(fullname)
+        finally:
+            self._finding = False
+
+        if spec is None or spec.loader is None:
+            return spec
+
+        exec_module = spec.loader.exec_module
+
+        def exec_module_and_patch(module):
+            # only remove ourselves once alembic is actually being imported - something merely
+            #  checking whether alembic is available (i.e find_spec) shouldn't stop us patching it
+            if self in sys.meta_path:
+                sys.meta_path.remove(self)
+
+            exec_module(module)
+            _on_alembic_import()
+
+        spec.loader.exec_module = exec_module_and_patch
+        return spec
+
+
+autocreate_hypertable_indexes()
+
+if 'alembic' in sys.modules:
+    _on_alembic_import()
+else:
+    sys.meta_path.insert(0, _AlembicImportHook())
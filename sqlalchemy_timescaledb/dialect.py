@@ -1,7 +1,12 @@
+from collections import deque
+import functools
+import sys
+
 from sqlalchemy import schema, event, DDL
 from sqlalchemy.dialects.postgresql.asyncpg import PGDialect_asyncpg
 from sqlalchemy.dialects.postgresql.base import PGDDLCompiler, PGDialect
 from sqlalchemy.dialects.postgresql.psycopg2 import PGDialect_psycopg2
+from sqlalchemy.ext import compiler
 from sqlalchemy.sql.elements import ClauseElement
 
 import logging
@@ -9,11 +14,21 @@ import logging
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
 
-try:
-    import alembic
-except ImportError:
-    pass
-else:
+TimescaledbImpl = None
+
+
+def register_alembic_impl():
+    """
+    Defines (and thereby registers with alembic) TimescaledbImpl, our alembic migration implementation for the
+     timescaledb dialect.
+
+    This is done lazily rather than at import time so that we don't pay for importing alembic unless it's
+     actually being used - see the alembic import hook in __init__.py, which calls this once alembic is imported.
+    """
+    global TimescaledbImpl
+    if TimescaledbImpl is not None:
+        return
+
     from alembic.ddl import postgresql
 
     class TimescaledbImpl(postgresql.PostgresqlImpl):
@@ -32,38 +47,28 @@ else:
             This is hacky and perhaps not ideal. I'd love to hear suggestions on alternatives :)
             """
 
-            if hasattr(table, "dialect_options"):
-                opts = table.dialect_options
-                tsdb_opts = opts.get('timescaledb', {})
-                ht_opts = tsdb_opts.get('hypertable', {})
-                time_col = ht_opts.get('time_column_name', "")
+            if getattr(table, "_hypertable_index_removed", False):
+                # we've already removed the timescaledb index from this table
+                return super().create_table(table, **kw)
 
-            if time_col:
-                # this is a hypertable with a time column specified,
-                #  filter indexes out
+            # the Index object for the timescaledb index (set by autocreate_hypertable_indexes):
+            hypertable_index = getattr(table, "_hypertable_index", None)
 
-                # expected name for timescaledb index:
-                tsdb_index_name = f"{table.name}_{time_col}_idx"
-
-                new_indexes = []
-                for idx in table.indexes:
-                    if idx.name != tsdb_index_name:
-                        new_indexes.append(idx)
-                    else:
-                        log.info(f"TimescaledbImpl.create_table: skipping timescaledb index creation for '{idx.name}'")
-
-                # replace table indexes with the filtered set
-                table.indexes = set(new_indexes)
+            if hypertable_index is not None and hypertable_index in table.indexes:
+                # this is a hypertable with a time column specified, remove its index
+                table.indexes.discard(hypertable_index)
+                table._hypertable_index_removed = True
+                log.info(f"TimescaledbImpl.create_table: skipping timescaledb index creation for '{hypertable_index.name}'")
 
             return super().create_table(table, **kw)
 
 
-
-
-
-def all_subclasses(cls, include_cls: bool = True) -> set:
+def all_subclasses(cls) -> set:
     """
-    A Recursive version of cls.__subclasses__() (i.e including subclasses of subclasses)
+    An iterative version of cls.__subclasses__() (i.e including subclasses of subclasses, and cls itself)
+
+    This is a breadth-first walk which visits each class only once, even if it's reachable via multiple
+     paths (which is common in sqlalchemy's ClauseElement hierarchy, due to mixins)
     """
     if not hasattr(cls, "__subclasses__"):
         if type(cls) is type:
@@ -73,15 +78,71 @@ def all_subclasses(cls, include_cls: bool = True) -> set:
 
         raise ValueError(f"Can't get subclasses of {cls_name}")
 
-    ret = cls.__subclasses__()
-    for subcls in ret:
-        ret += all_subclasses(subcls, include_cls = False)
+    seen = {cls}
+    queue = deque([cls])
+    while queue:
+        for subcls in queue.popleft().__subclasses__():
+            if subcls not in seen:
+                seen.add(subcls)
+                queue.append(subcls)
 
-    if include_cls:
-        ret = [cls] + ret
+    return seen
 
-    return set(ret)
 
+def quote_literal(value: str) -> str:
+    """
+    Renders value as a SQL string literal, e.g "it's" -> 'it''s'
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+@functools.lru_cache(maxsize=None, typed=True)
+def normalize_chunk_time_interval(chunk_time_interval) -> str:
+    """
+    Renders a hypertable's chunk_time_interval as SQL: either an integer or an INTERVAL literal
+     e.g '86400' -> 86400, '7 days' -> INTERVAL '7 days'
+
+    Tables tend to share a handful of intervals, so results are cached
+    """
+    if isinstance(chunk_time_interval, str):
+        if chunk_time_interval.isdigit():
+            return str(int(chunk_time_interval))
+
+        return f"INTERVAL {quote_literal(chunk_time_interval)}"
+
+    return str(chunk_time_interval)
+
+
+# dialect names used as compiler dispatcher keys
+_POSTGRESQL = sys.intern('postgresql')
+_TIMESCALEDB = sys.intern('timescaledb')
+
+_postgres_compilers_patched = False
+
+
+class TimescaledbCompilerSpecs(dict):
+    """
+    A compiler dispatcher 'specs' dict which also registers any postgresql compiler for timescaledb
+     (unless a timescaledb-specific compiler has been registered)
+
+    patch_postgres_compilers swaps this in for the specs of every compiler dispatcher, so compilers registered
+     after it has run (e.g via @compiles in a module imported later) are mirrored too, without rescanning.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        postgresql_compiler = self.get(_POSTGRESQL)
+        if postgresql_compiler is not None:
+            self.setdefault(_TIMESCALEDB, postgresql_compiler)
+
+    def __setitem__(self, key, value):
+        if key == _POSTGRESQL:
+            previous = self.get(_POSTGRESQL)
+            if self.get(_TIMESCALEDB, previous) is previous:
+                # timescaledb is mirroring (or doesn't have) the postgresql compiler, keep it in sync
+                super().__setitem__(_TIMESCALEDB, value)
+
+        super().__setitem__(key, value)
 
 
 class TimescaledbDDLCompiler(PGDDLCompiler):
@@ -127,17 +188,51 @@ class TimescaledbDDLCompiler(PGDDLCompiler):
 
         This approach saves us from needing to re-implement timescaledb compilers for everything - if we didn't do the
          above, we would need to manually copy a bunch of compilers, like you see commented out at the end of this file
+
+        The subclass walk is only done once per process - subsequent calls return immediately. Compilers registered
+         later are handled by TimescaledbCompilerSpecs, which we install into every existing and future dispatcher.
         """
 
+        # prevent walking the ClauseElement tree on every compile
+        global _postgres_compilers_patched
+        if _postgres_compilers_patched:
+            return
+
+        # dispatchers created from now on (i.e the first @compiles for a class) get mirroring specs:
+        dispatcher_init = compiler._dispatcher.__init__
+
+        def _dispatcher_init_(self, *args, **kwargs):
+            dispatcher_init(self, *args, **kwargs)
+            self.specs = TimescaledbCompilerSpecs(self.specs)
+
+        compiler._dispatcher.__init__ = _dispatcher_init_
+
+        # ...and we swap them into existing dispatchers:
         for cls in all_subclasses(ClauseElement):
-            if (hasattr(cls, "_compiler_dispatcher") and hasattr(cls._compiler_dispatcher, "specs") and 'postgresql' in cls._compiler_dispatcher.specs):
-                # print(f"Patching compiler to use {cls._compiler_dispatcher.specs['postgresql']} for {cls} and timescaledb dialect")
-                cls._compiler_dispatcher.specs['timescaledb'] = cls._compiler_dispatcher.specs['postgresql']
+            dispatcher = getattr(cls, "_compiler_dispatcher", None)
+            if dispatcher is None:
+                continue
+
+            specs = getattr(dispatcher, "specs", None)
+            if specs is None or isinstance(specs, TimescaledbCompilerSpecs):
+                continue
+
+            dispatcher.specs = TimescaledbCompilerSpecs(specs)
+
+        _postgres_compilers_patched = True
 
     def post_create_table(self, table):
-        hypertable = table.kwargs.get('timescaledb_hypertable', {})
+        hypertable = table.kwargs.get('timescaledb_hypertable')
+
+        if hypertable is not None:
+            # (we check this here rather than when the table is declared, because by now all columns are attached)
+            time_column_name = hypertable.get('time_column_name')
+            if not time_column_name:
+                raise ValueError("Timescaledb hypertables must have a time_column_name defined!")
+
+            if time_column_name not in table.c:
+                raise ValueError(f"Timescaledb hypertable '{table.name}' has no time column '{time_column_name}'!")
 
-        if hypertable:
             event.listen(
                 table,
                 'after_create',
@@ -153,23 +248,24 @@ class TimescaledbDDLCompiler(PGDDLCompiler):
     @staticmethod
     def ddl_hypertable(table_name, hypertable):
         time_column_name = hypertable['time_column_name']
-        chunk_time_interval = hypertable.get('chunk_time_interval', '7 days')
-
-        if isinstance(chunk_time_interval, str):
-            if chunk_time_interval.isdigit():
-                chunk_time_interval = int(chunk_time_interval)
-            else:
-                chunk_time_interval = f"INTERVAL '{chunk_time_interval}'"
+        chunk_time_interval = normalize_chunk_time_interval(hypertable.get('chunk_time_interval', '7 days'))
 
+        # values are substituted via the DDL context (rather than formatted into the statement directly)
+        #  so that they're quoted as proper SQL string literals
         return DDL(
-            f"""
+            """
             SELECT create_hypertable(
-                '{table_name}',
-                '{time_column_name}',
-                chunk_time_interval => {chunk_time_interval},
+                %(table_name)s,
+                %(time_column_name)s,
+                chunk_time_interval => %(chunk_time_interval)s,
                 if_not_exists => TRUE
             );
-            """
+            """,
+            context={
+                'table_name': quote_literal(table_name),
+                'time_column_name': quote_literal(time_column_name),
+                'chunk_time_interval': chunk_time_interval,
+            }
         )
 
 
@@ -179,11 +275,20 @@ class TimescaledbDialect(PGDialect):
     construct_arguments = [
         (
             schema.Table, {
-                "hypertable": {}
+                # None (rather than {}) so that we can tell whether timescaledb_hypertable was given at all
+                "hypertable": None
             }
         )
     ]
 
+    @staticmethod
+    def _hypertable_index_name(table_name: str, column_name: str) -> str:
+        """
+        The name of the index timescaledb automatically creates on a hypertable's time column
+         when create_hypertable() is called
+        """
+        return table_name + "_" + column_name + "_idx"
+
 
 class TimescaledbPsycopg2Dialect(TimescaledbDialect,PGDialect_psycopg2):
     driver = 'psycopg2'
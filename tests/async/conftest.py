@@ -1,7 +1,8 @@
+import pytest
 import pytest_asyncio
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 
-from tests.models import Base, DATABASE_URL
+from tests.models import DATABASE_URL
 
 
 @pytest_asyncio.fixture
@@ -18,10 +19,6 @@ async def async_session(async_engine):
         yield session
 
 
-@pytest_asyncio.fixture(autouse=True)
-async def setup(async_engine):
-    async with async_engine.begin() as connection:
-        await connection.run_sync(Base.metadata.create_all)
+@pytest.fixture(autouse=True)
+def setup(schema):
     yield
-    async with async_engine.begin() as connection:
-        await connection.run_sync(Base.metadata.drop_all)
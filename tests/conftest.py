@@ -9,27 +9,39 @@ from tests.models import Base, DATABASE_URL
 register(MetricFactory)
 
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def engine():
-    yield create_engine(DATABASE_URL, echo=True)
+    engine = create_engine(DATABASE_URL, echo=True)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope='session')
+def schema(engine):
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
 
 
 @pytest.fixture
-def session(engine):
-    with Session(engine) as session:
-        yield session
+def connection(engine, schema):
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        yield connection
+        transaction.rollback()
+
 
+@pytest.fixture
+def session(connection):
+    with Session(bind=connection, join_transaction_mode='create_savepoint') as session:
+        yield session
 
-_factory_session = None
 
 @pytest.fixture(autouse=True)
-def setup(engine):
-    global _factory_session
-    if _factory_session is None:
-        _factory_session = FactorySession.configure(bind=engine)
-    Base.metadata.create_all(bind=engine)
+def setup(connection):
+    FactorySession.configure(bind=connection, join_transaction_mode='create_savepoint')
     yield
-    Base.metadata.drop_all(bind=engine)
+    FactorySession.remove()
 
 
 @pytest.fixture
@@ -1,12 +1,29 @@
+import io
 import os
+import subprocess
+import sys
 from pathlib import Path
 
 from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.autogenerate.api import AutogenContext
 from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table
 
+from sqlalchemy_timescaledb.dialect import TimescaledbPsycopg2Dialect
 from tests.models import Base
 
 
+def hypertable(metadata):
+    return Table(
+        'test', metadata,
+        Column('timestamp', DateTime),
+        Column('value', Integer, index=True),
+        timescaledb_hypertable={'time_column_name': 'timestamp'}
+    )
+
+
 class TestAlembic:
     def setup_class(self):
         # TODO: Disable output for alembic
@@ -33,22 +50,92 @@ class TestAlembic:
         Path(migration_file).unlink()
         Base.metadata.create_all(bind=engine)
 
-    def test_alembic_migration_doesnt_drop_indexes_created_by_timescaledb(self,engine):
-        #TODO: write a test for this
+    def test_alembic_migration_doesnt_drop_indexes_created_by_timescaledb(self, engine):
         # see: https://github.com/dorosch/sqlalchemy-timescaledb/issues/21 for details of the bug
         # bug fixed by autocreate_hypertable_indexes()
-        assert True
+        with engine.connect() as connection:
+            diff = compare_metadata(MigrationContext.configure(connection), Base.metadata)
+
+        assert not [
+            change for change in diff
+            if change[0] in ('add_index', 'remove_index') and change[1].name == 'metrics_timestamp_idx'
+        ]
 
-    def test_alembic_migration_doesnt_try_to_create_hypertable_indexes_when_creating_table(self,engine):
-        #TODO: write a test for this
+    def test_alembic_migration_doesnt_try_to_create_hypertable_indexes_when_creating_table(self):
         # When creating a hypertable, alembic should not emit a CREATE INDEX for the auto-created timescaledb
         #  time column index. See: TimescaledbImpl.create_table in dialect.py
-        assert True
+        table = hypertable(MetaData())
+        output = io.StringIO()
+        context = MigrationContext.configure(
+            dialect=TimescaledbPsycopg2Dialect(),
+            opts={'as_sql': True, 'output_buffer': output}
+        )
+
+        context.impl.create_table(table)
+        context.impl.create_table(table)
 
-    def test_alembic_ignores_timescaledb_indexes(self,engine):
-        #TODO: write a test for this
-        # tests the functionality of alembic_ignore_timescaledb_indexes - if a hypertable time column index
-        #  is changed, that change should be ignored by alembic migrations, as if the index had been ignored via
+        sql = output.getvalue()
+        assert sql.count('CREATE TABLE test') == 2
+        assert sql.count('CREATE INDEX ix_test_value') == 2
+        assert 'test_timestamp_idx' not in sql
+        assert table._hypertable_index not in table.indexes
+
+    def test_alembic_ignores_timescaledb_indexes(self):
+        # tests the functionality of alembic_ignore_timescaledb_indexes - hypertable time column indexes
+        #  should be ignored by alembic migrations, as if the index had been ignored via
         #  alembic's include_object hook
-        assert True
+        metadata = MetaData()
+        table = hypertable(metadata)
+        context = AutogenContext(
+            MigrationContext.configure(dialect=TimescaledbPsycopg2Dialect()),
+            metadata=metadata
+        )
+        indexes = {index.name: index for index in table.indexes}
 
+        assert not context.run_object_filters(
+            indexes['test_timestamp_idx'], 'test_timestamp_idx', 'index', False, None
+        )
+        assert not context.run_object_filters(
+            indexes['test_timestamp_idx'], 'test_timestamp_idx', 'index', True, None
+        )
+        assert context.run_object_filters(
+            indexes['ix_test_value'], 'ix_test_value', 'index', False, None
+        )
+        assert context.run_object_filters(table, 'test', 'table', False, None)
+
+    def test_alembic_ignores_timescaledb_indexes_without_index_object(self):
+        # hypertables which didn't get an Index from autocreate_hypertable_indexes (e.g because the time
+        #  column is missing) should still have their timescaledb index ignored
+        metadata = MetaData()
+        Table(
+            'test', metadata,
+            Column('value', Integer),
+            timescaledb_hypertable={'time_column_name': 'timestamp'}
+        )
+        context = AutogenContext(
+            MigrationContext.configure(dialect=TimescaledbPsycopg2Dialect()),
+            metadata=metadata
+        )
+
+        assert not context.run_object_filters(None, 'test_timestamp_idx', 'index', True, None)
+        assert context.run_object_filters(None, 'ix_test_value', 'index', True, None)
+
+    def test_alembic_integration_survives_find_spec_probe(self):
+        # checking whether alembic is installed (without importing it) mustn't stop us
+        #  patching alembic when it's imported later. alembic is already imported in this
+        #  process, so we need a fresh interpreter to test this
+        code = (
+            "import importlib.util\n"
+            "import sqlalchemy_timescaledb\n"
+            "assert importlib.util.find_spec('alembic') is not None\n"
+            "import alembic\n"
+            "from alembic.ddl.impl import DefaultImpl\n"
+            "from sqlalchemy_timescaledb import dialect\n"
+            "assert dialect.TimescaledbImpl is not None\n"
+            "assert DefaultImpl.get_by_dialect(dialect.TimescaledbPsycopg2Dialect()) is dialect.TimescaledbImpl\n"
+        )
+        subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=os.path.dirname(os.path.dirname(__file__)),
+            check=True
+        )
@@ -1,7 +1,11 @@
 import pytest
-from sqlalchemy import DDL
+from sqlalchemy import DDL, Column, DateTime, MetaData, Table
+from sqlalchemy.dialects.postgresql.psycopg2 import PGDialect_psycopg2
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.sql.expression import ColumnClause
 
-from sqlalchemy_timescaledb.dialect import TimescaledbDDLCompiler
+from sqlalchemy_timescaledb.dialect import TimescaledbDDLCompiler, TimescaledbPsycopg2Dialect
 
 
 class TestTimescaledbDDLCompiler:
@@ -23,7 +27,9 @@ class TestTimescaledbDDLCompiler:
         ('1 days', "INTERVAL '1 days'"),
         ('7 hour', "INTERVAL '7 hour'"),
         (86400, 86400),
-        ('86400', 86400)
+        ('86400', 86400),
+        (1, 1),
+        (1.0, 1.0)
     ])
     def test_chunk_time_interval(self, interval, expected):
         assert TimescaledbDDLCompiler.ddl_hypertable(
@@ -41,3 +47,85 @@ class TestTimescaledbDDLCompiler:
             );
             """
         ).compile().string
+
+    def test_quotes_names(self):
+        assert TimescaledbDDLCompiler.ddl_hypertable(
+            "test's", {'time_column_name': "time'stamp"}
+        ).compile().string == DDL(
+            f"""
+            SELECT create_hypertable(
+                'test''s',
+                'time''stamp',
+                chunk_time_interval => INTERVAL '7 days',
+                if_not_exists => TRUE
+            );
+            """
+        ).compile().string
+
+    def test_hypertable_time_column_must_exist(self):
+        table = Table(
+            'test', MetaData(),
+            Column('timestamp', DateTime),
+            timescaledb_hypertable={'time_column_name': 'missing'}
+        )
+
+        with pytest.raises(ValueError):
+            CreateTable(table).compile(dialect=TimescaledbPsycopg2Dialect())
+
+
+class TestPostgresCompilers:
+    def setup_method(self):
+        # make sure the initial compiler patching has been done
+        CreateTable(
+            Table('test', MetaData(), Column('timestamp', DateTime))
+        ).compile(dialect=TimescaledbPsycopg2Dialect())
+
+    def test_compiler_registered_later_is_used(self):
+        class Clause(ColumnClause):
+            inherit_cache = True
+
+        @compiles(Clause, 'postgresql')
+        def compile_postgresql(element, compiler, **kw):
+            return 'postgresql'
+
+        assert Clause('x').compile(dialect=TimescaledbPsycopg2Dialect()).string == 'postgresql'
+
+        @compiles(Clause, 'postgresql')
+        def compile_postgresql_again(element, compiler, **kw):
+            return 'postgresql again'
+
+        assert Clause('x').compile(dialect=TimescaledbPsycopg2Dialect()).string == 'postgresql again'
+
+    def test_timescaledb_compiler_is_not_overwritten(self):
+        class Clause(ColumnClause):
+            inherit_cache = True
+
+        @compiles(Clause, 'postgresql')
+        def compile_postgresql(element, compiler, **kw):
+            return 'postgresql'
+
+        @compiles(Clause, 'timescaledb')
+        def compile_timescaledb(element, compiler, **kw):
+            return 'timescaledb'
+
+        @compiles(Clause, 'postgresql')
+        def compile_postgresql_again(element, compiler, **kw):
+            return 'postgresql again'
+
+        assert Clause('x').compile(dialect=TimescaledbPsycopg2Dialect()).string == 'timescaledb'
+        assert Clause('x').compile(dialect=PGDialect_psycopg2()).string == 'postgresql again'
+
+    def test_postgresql_dialect_is_unaffected(self):
+        class Clause(ColumnClause):
+            inherit_cache = True
+
+        @compiles(Clause)
+        def compile_default(element, compiler, **kw):
+            return 'default'
+
+        @compiles(Clause, 'timescaledb')
+        def compile_timescaledb(element, compiler, **kw):
+            return 'timescaledb'
+
+        assert Clause('x').compile(dialect=PGDialect_psycopg2()).string == 'default'
+        assert Clause('x').compile(dialect=TimescaledbPsycopg2Dialect()).string == 'timescaledb'
@@ -0,0 +1,118 @@
+import pytest
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table
+from sqlalchemy.orm import declarative_base
+
+from sqlalchemy_timescaledb import autocreate_hypertable_indexes
+
+
+def index_names(table):
+    return {index.name for index in table.indexes}
+
+
+class TestAutocreateHypertableIndexes:
+    def test_table(self):
+        table = Table(
+            'test', MetaData(),
+            Column('id', Integer, primary_key=True),
+            Column('timestamp', DateTime),
+            timescaledb_hypertable={'time_column_name': 'timestamp'}
+        )
+
+        assert index_names(table) == {'test_timestamp_idx'}
+        assert table._hypertable_index in table.indexes
+        assert table._tsdb_hypertable_index_name == 'test_timestamp_idx'
+
+    def test_declarative_model(self):
+        class Test(declarative_base()):
+            __tablename__ = 'test'
+            __table_args__ = (
+                {
+                    'timescaledb_hypertable': {
+                        'time_column_name': 'timestamp'
+                    }
+                }
+            )
+
+            id = Column(Integer, primary_key=True)
+            timestamp = Column(DateTime, primary_key=True)
+
+        assert index_names(Test.__table__) == {'test_timestamp_idx'}
+
+    def test_plain_table(self):
+        table = Table(
+            'test', MetaData(),
+            Column('id', Integer, primary_key=True),
+            Column('timestamp', DateTime)
+        )
+
+        assert table.indexes == set()
+        assert 'timescaledb' not in table.dialect_options
+
+    def test_append_column(self):
+        table = Table(
+            'test', MetaData(),
+            Column('id', Integer, primary_key=True),
+            timescaledb_hypertable={'time_column_name': 'timestamp'}
+        )
+        assert table.indexes == set()
+
+        table.append_column(Column('timestamp', DateTime))
+
+        assert index_names(table) == {'test_timestamp_idx'}
+
+    def test_extend_existing(self):
+        metadata = MetaData()
+        table = Table(
+            'test', metadata,
+            Column('timestamp', DateTime),
+            timescaledb_hypertable={'time_column_name': 'timestamp'}
+        )
+        Table(
+            'test', metadata,
+            Column('id', Integer),
+            extend_existing=True
+        )
+
+        assert len(table.indexes) == 1
+
+    @pytest.mark.parametrize('columns', [
+        (),
+        (Column('id', Integer),),
+    ])
+    def test_extend_existing_with_hypertable(self, columns):
+        # the time column is already attached when the hypertable options arrive
+        metadata = MetaData()
+        Table('test', metadata, Column('timestamp', DateTime))
+        table = Table(
+            'test', metadata,
+            *columns,
+            extend_existing=True,
+            timescaledb_hypertable={'time_column_name': 'timestamp'}
+        )
+
+        assert index_names(table) == {'test_timestamp_idx'}
+        assert table._tsdb_hypertable_index_name == 'test_timestamp_idx'
+
+    def test_registration_is_idempotent(self):
+        autocreate_hypertable_indexes()
+        autocreate_hypertable_indexes()
+
+        table = Table(
+            'test', MetaData(),
+            Column('timestamp', DateTime),
+            timescaledb_hypertable={'time_column_name': 'timestamp'}
+        )
+
+        assert len(table.indexes) == 1
+
+    @pytest.mark.parametrize('hypertable', [
+        {},
+        {'chunk_time_interval': '1 days'},
+    ])
+    def test_time_column_name_required(self, hypertable):
+        with pytest.raises(ValueError):
+            Table(
+                'test', MetaData(),
+                Column('timestamp', DateTime),
+                timescaledb_hypertable=hypertable
+            )